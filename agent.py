@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# agent.py — ship this node's probe CSVs to a central NetWatch collector
+from datetime import datetime
+import urllib.request
+import urllib.error
+import argparse
+import socket
+import gzip
+import json
+import time
+import uuid
+import csv
+import os
+
+from netwatch_store import SOURCES
+
+# -------------------------
+# CONFIG
+# -------------------------
+COLLECTOR_URL = "http://127.0.0.1:5000/api/ingest"
+DATA_DIR = "data"
+INTERVAL = 15               # time between 2 shipping cycles (s)
+MAX_ROWS = 5000             # max rows per source in one batch
+RETRIES = 3                 # send attempts before the batch goes to the spool
+TIMEOUT = 10                # HTTP timeout (s)
+
+# send_batch results: REJECTED batches are dead-lettered, FAILED ones stay queued,
+# TOO_LARGE ones are split in two and sent again
+SENT, REJECTED, FAILED, TOO_LARGE = "sent", "rejected", "failed", "too_large"
+REJECT_CODES = (400, 422)   # the collector refused this payload: resending cannot help
+
+# -------------------------
+# HELPERS
+# -------------------------
+def load_state(path):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Error reading {path}: {e}")
+        return {}
+
+def save_state(path, state):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+def read_new_rows(file_path, offset, columns, max_rows):
+    """Read complete lines after byte `offset`. Returns (rows as dicts, new offset)."""
+    if not os.path.exists(file_path):
+        return [], 0
+    if os.path.getsize(file_path) < offset:
+        offset = 0  # file was truncated / recreated
+    rows = []
+    with open(file_path, "rb") as f:
+        f.seek(offset)
+        while len(rows) < max_rows:
+            line = f.readline()
+            if not line or not line.endswith(b"\n"):
+                break  # nothing more, or the probe is still writing this line
+            offset = f.tell()
+            values = next(csv.reader([line.decode("utf-8", errors="replace")]), [])
+            if not values or values[0] == "timestamp":
+                continue  # header
+            if len(values) != len(columns):
+                print(f"Skipping malformed row in {file_path}: {values}")
+                continue
+            rows.append(dict(zip(columns, values)))
+    return rows, offset
+
+def send_batch(url, payload, token=None, retries=RETRIES):
+    """POST a gzip-compressed batch, retrying with backoff. Returns SENT, REJECTED, TOO_LARGE or FAILED."""
+    headers = {"Content-Type": "application/json", "Content-Encoding": "gzip"}
+    if token:
+        headers["X-NetWatch-Token"] = token
+    for attempt in range(retries):
+        try:
+            req = urllib.request.Request(url, data=payload, headers=headers, method="POST")
+            with urllib.request.urlopen(req, timeout=TIMEOUT) as resp:
+                if resp.status == 200:
+                    return SENT
+        except urllib.error.HTTPError as e:
+            if e.code in REJECT_CODES:
+                print(f"Collector rejected batch ({e.code})")
+                return REJECTED
+            if e.code == 413:
+                return TOO_LARGE
+            # 401/403/404 (token or URL misconfigured), 408, 429 and 5xx: keep the batch and retry later
+            print(f"Collector error {e.code} (attempt {attempt + 1}/{retries})")
+        except (urllib.error.URLError, OSError) as e:
+            print(f"Send failed: {e} (attempt {attempt + 1}/{retries})")
+        if attempt + 1 < retries:
+            time.sleep(2 ** attempt)
+    return FAILED
+
+def split_payload(payload):
+    """Split a batch into two (batch_id, payload) halves; ids are derived so retries stay idempotent. None if it cannot be split."""
+    batch = json.loads(gzip.decompress(payload))
+    rows = [(table, row) for table, table_rows in batch["records"].items() for row in table_rows]
+    if len(rows) < 2:
+        return None
+    halves = []
+    for i, part in enumerate((rows[:len(rows) // 2], rows[len(rows) // 2:]), start=1):
+        records = {}
+        for table, row in part:
+            records.setdefault(table, []).append(row)
+        batch_id = f"{batch['batch_id']}.{i}"
+        halves.append((batch_id, gzip.compress(json.dumps({
+            "node": batch["node"],
+            "batch_id": batch_id,
+            "records": records,
+        }).encode("utf-8"))))
+    return halves
+
+def deliver(url, payload, spool_dir, token=None, retries=RETRIES):
+    """send_batch, splitting the batch while the collector answers 413. Returns SENT, REJECTED or FAILED."""
+    result = send_batch(url, payload, token, retries)
+    if result != TOO_LARGE:
+        return result
+    halves = split_payload(payload)
+    if halves is None:
+        print("Collector rejected a single-row batch as too large")
+        return REJECTED
+    print(f"Batch too large ({len(payload)} bytes gz), splitting in two")
+    for batch_id, half in halves:
+        result = deliver(url, half, spool_dir, token, retries)
+        if result == FAILED:
+            # whole batch stays queued; halves already stored are deduplicated by their batch id
+            return FAILED
+        if result == REJECTED:
+            dead_letter(spool_dir, f"{batch_id}.json.gz", half)
+    return SENT
+
+def spool_batch(spool_dir, batch_id, payload):
+    os.makedirs(spool_dir, exist_ok=True)
+    # timestamped name so the spool is flushed oldest first
+    name = f"{datetime.now().strftime('%Y%m%d%H%M%S')}_{batch_id}.json.gz"
+    tmp = os.path.join(spool_dir, name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(payload)
+    os.replace(tmp, os.path.join(spool_dir, name))
+
+def dead_letter(spool_dir, name, payload):
+    """Keep a batch the collector rejected out of the queue, for manual inspection."""
+    rejected_dir = os.path.join(spool_dir, "rejected")
+    os.makedirs(rejected_dir, exist_ok=True)
+    with open(os.path.join(rejected_dir, name), "wb") as f:
+        f.write(payload)
+    print(f"Batch {name} moved to {rejected_dir}")
+
+def flush_spool(spool_dir, url, token=None):
+    """Resend spooled batches oldest first; stop at the first failure. Returns True if spool is empty."""
+    if not os.path.isdir(spool_dir):
+        return True
+    for name in sorted(n for n in os.listdir(spool_dir) if n.endswith(".json.gz")):
+        path = os.path.join(spool_dir, name)
+        with open(path, "rb") as f:
+            payload = f.read()
+        result = deliver(url, payload, spool_dir, token, retries=1)
+        if result == FAILED:
+            return False
+        if result == REJECTED:
+            dead_letter(spool_dir, name, payload)
+        else:
+            print(f"Spooled batch {name} delivered")
+        os.remove(path)
+    return True
+
+# -------------------------
+# MAIN LOOP
+# -------------------------
+def main(args):
+    state_file = args.state or os.path.join(args.data_dir, "agent_state.json")
+    spool_dir = args.spool or os.path.join(args.data_dir, "spool")
+    state = load_state(state_file)
+    print(f"Start NetWatch agent — node={args.node} data={args.data_dir} → {args.collector} (every {args.interval}s)")
+
+    try:
+        while True:
+            spool_empty = flush_spool(spool_dir, args.collector, args.token)
+
+            records, offsets, total = {}, {}, 0
+            for source, spec in SOURCES.items():
+                path = os.path.join(args.data_dir, spec["file"])
+                rows, offsets[path] = read_new_rows(path, state.get(path, 0), spec["columns"], args.max_rows)
+                if rows:
+                    records[source] = rows
+                    total += len(rows)
+
+            if total:
+                batch_id = uuid.uuid4().hex
+                payload = gzip.compress(json.dumps({
+                    "node": args.node,
+                    "batch_id": batch_id,
+                    "records": records,
+                }).encode("utf-8"))
+                timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                # keep order: while older batches are spooled, new ones queue behind them
+                result = deliver(args.collector, payload, spool_dir, args.token) if spool_empty else FAILED
+                if result == SENT:
+                    print(f"[{timestamp}] sent {total} rows ({len(payload)} bytes gz)")
+                elif result == REJECTED:
+                    dead_letter(spool_dir, f"{batch_id}.json.gz", payload)
+                else:
+                    spool_batch(spool_dir, batch_id, payload)
+                    print(f"[{timestamp}] collector unreachable, spooled {total} rows")
+                # rows are either delivered or safely on disk -> advance offsets
+                state.update(offsets)
+                save_state(state_file, state)
+
+            time.sleep(args.interval)
+
+    except KeyboardInterrupt:
+        print("Stopped by user.")
+
+# -------------------------
+# CLI
+# -------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="NetWatch agent: tail probe CSVs -> batch -> gzip -> collector")
+    parser.add_argument("--collector", default=COLLECTOR_URL, help="Collector ingest URL")
+    parser.add_argument("--node", "-n", default=socket.gethostname(), help="Node name shown in the dashboard")
+    parser.add_argument("--data-dir", "-d", default=DATA_DIR, help="Directory with the probe CSV files")
+    parser.add_argument("--interval", "-t", type=int, default=INTERVAL, help="Interval between shipping cycles (seconds)")
+    parser.add_argument("--max-rows", type=int, default=MAX_ROWS, help="Max rows per source in one batch")
+    parser.add_argument("--state", default=None, help="Offset state file (default: <data-dir>/agent_state.json)")
+    parser.add_argument("--spool", default=None, help="Spool directory for outages (default: <data-dir>/spool)")
+    parser.add_argument("--token", default=os.environ.get("NETWATCH_TOKEN"), help="Shared token expected by the collector")
+    args = parser.parse_args()
+    main(args)
+
+    # run code: python3 agent.py --collector http://collector:5000/api/ingest --node pi-lab
+    # local test, one collector + two agents:
+    #   python3 collector.py --db /tmp/nw.db --port 5000 &
+    #   python3 agent.py --node pi-a --data-dir data --state /tmp/a_state.json --spool /tmp/a_spool &
+    #   python3 agent.py --node pi-b --data-dir data --state /tmp/b_state.json --spool /tmp/b_spool &
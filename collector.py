@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# collector.py — central ingest service for many Pi NetWatch agents
+from flask import Flask, request, jsonify
+from datetime import datetime
+import argparse
+import sqlite3
+import zlib
+import json
+import time
+import os
+
+import netwatch_store
+
+app = Flask(__name__)
+
+# -------------------------
+# CONFIG
+# -------------------------
+DB_FILE = os.environ.get("NETWATCH_STORE", netwatch_store.DEFAULT_DB)
+TOKEN = os.environ.get("NETWATCH_TOKEN", "")     # empty -> no auth check
+PORT = 5000
+RETENTION_DAYS = int(os.environ.get("NETWATCH_RETENTION_DAYS", netwatch_store.RETENTION_DAYS))
+PRUNE_EVERY = 3600          # seconds between 2 retention passes
+MAX_BODY = 16 * 1024 * 1024         # compressed request body (Flask answers 413 above it)
+MAX_DECOMPRESSED = 64 * 1024 * 1024 # JSON after gunzip; caps gzip bombs
+
+app.config["MAX_CONTENT_LENGTH"] = MAX_BODY
+
+conn = None
+_last_prune = None
+
+def maybe_prune():
+    global _last_prune
+    now = time.monotonic()
+    if not RETENTION_DAYS or (_last_prune is not None and now - _last_prune < PRUNE_EVERY):
+        return
+    _last_prune = now
+    try:
+        deleted = netwatch_store.prune(get_store(), RETENTION_DAYS)
+        if deleted:
+            print(f"Pruned {deleted} rows older than {RETENTION_DAYS} days")
+    except sqlite3.Error as e:
+        print(f"Error pruning store: {e}")
+
+def get_store():
+    global conn
+    if conn is None:
+        os.makedirs(os.path.dirname(DB_FILE) or ".", exist_ok=True)
+        conn = netwatch_store.open_store(DB_FILE)
+    return conn
+
+# --------------------
+# Routes
+# --------------------
+@app.route('/api/ingest', methods=['POST'])
+def api_ingest():
+    if TOKEN and request.headers.get("X-NetWatch-Token") != TOKEN:
+        return jsonify({"error": "bad token"}), 401
+
+    body = request.get_data()
+    try:
+        if request.headers.get("Content-Encoding") == "gzip":
+            d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            body = d.decompress(body, MAX_DECOMPRESSED)
+            if d.unconsumed_tail:
+                return jsonify({"error": f"batch larger than {MAX_DECOMPRESSED} bytes uncompressed"}), 413
+            if not d.eof:
+                return jsonify({"error": "bad payload: truncated gzip stream"}), 400
+        batch = json.loads(body)
+    except (OSError, ValueError, zlib.error) as e:
+        return jsonify({"error": f"bad payload: {e}"}), 400
+    if not isinstance(batch, dict):
+        return jsonify({"error": "payload must be an object"}), 400
+
+    node = batch.get("node")
+    batch_id = batch.get("batch_id")
+    records = batch.get("records")
+    if not isinstance(node, str) or not isinstance(batch_id, str) or not node or not batch_id:
+        return jsonify({"error": "node and batch_id must be non-empty strings"}), 400
+    if not isinstance(records, dict):
+        return jsonify({"error": "records must be an object"}), 400
+    for table, rows in records.items():
+        if not isinstance(rows, list) or not all(isinstance(r, dict) for r in rows):
+            return jsonify({"error": f"records.{table} must be a list of objects"}), 400
+
+    received_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    try:
+        stored = netwatch_store.insert_batch(get_store(), node, batch_id, records, received_at)
+    except sqlite3.Error as e:
+        return jsonify({"error": f"store error: {e}"}), 500
+    maybe_prune()
+    return jsonify({"batch_id": batch_id, "stored": stored})
+
+@app.route('/api/nodes')
+def api_nodes():
+    return jsonify(netwatch_store.list_nodes(get_store()))
+
+# -------------------------
+# CLI
+# -------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="NetWatch collector: receive agent batches -> SQLite store")
+    parser.add_argument("--db", default=DB_FILE, help="SQLite store file")
+    parser.add_argument("--port", "-p", type=int, default=PORT, help="Listen port")
+    parser.add_argument("--retention-days", type=int, default=RETENTION_DAYS, help="Prune rows older than this (0 = keep all)")
+    args = parser.parse_args()
+    DB_FILE = args.db
+    RETENTION_DAYS = args.retention_days
+    get_store()
+    maybe_prune()
+    print(f"Collector listening on 0.0.0.0:{args.port} → store: {DB_FILE}")
+    app.run(host="0.0.0.0", port=args.port, debug=False, threaded=True)
+
+    # run code: python3 collector.py --db data/netwatch.db --port 5000
+    # dashboard on the collector: NETWATCH_STORE=data/netwatch.db python3 dashboard_app.py
@@ -1,16 +1,29 @@
 
 #!/usr/bin/env python3
 # app.py — Flask dashboard for Pi NetWatch
-from flask import Flask, render_template_string, jsonify
+from flask import Flask, render_template_string, jsonify, request, Response, abort
 import pandas as pd
+from bisect import bisect_right
+import threading
+import hashlib
+import gzip
+import json
 import os
 
+import netwatch_store
+from device_index import DEVICE_CSV
+
 app = Flask(__name__)
 
 # Files produced by your probes / merger
 MERGED_CSV = "data/merged_summary.csv"    # produced by main.py (merged Scapy + TShark + Ping)
 TRAFFIC_CSV = "data/traffic_probe.csv"    # Scapy probe (if you want direct)
 TSHARK_CSV = "data/tshark_probe.csv"      # tshark probe
+# DEVICE_CSV (device_index.py): per-device accounting from traffic/tshark probe + devices.json
+DEVICE_SOURCE = "tshark"    # preferred probe for the devices panel when both write device rows
+
+# Collector store (collector.py) — when set, data comes from all agents instead of the local CSVs
+STORE_DB = os.environ.get("NETWATCH_STORE")
 
 # HTML template (keeps layout similar to your previous dashboard)
 TEMPLATE = """
@@ -38,6 +51,11 @@ h1 { text-align:center; margin-bottom:8px; }
 <body>
 <h1>📡 Pi NetWatch — Dashboard</h1>
 
+<div id="node_bar" style="text-align:center; margin-bottom:10px; display:none;">
+  <span class="label" style="display:inline;">Node:</span>
+  <select id="node_select"><option value="">All nodes</option></select>
+</div>
+
 <div class="donut-row" style="margin-bottom:14px;">
   <div class="card donut-card">
     <div class="label">Ping: Success vs Loss (%)</div>
@@ -73,6 +91,12 @@ h1 { text-align:center; margin-bottom:8px; }
   <canvas id="tsharkChart"></canvas>
 </div>
 
+<div class="chart-card card">
+  <div class="label">Devices — Packets by protocol (latest window)</div>
+  <canvas id="deviceChart"></canvas>
+  <div class="kpi" id="device_kpi">No per-device data (add devices.json)</div>
+</div>
+
 <script>
 const protoColors=['#2ca8ff','#ff6b8a','#ffb463','#ffe07a'];
 
@@ -92,38 +116,82 @@ const pingDonut = new Chart(document.getElementById('pingDonut'), {
 const trafficDonut = mkDonut('trafficDonut');
 const tsharkDonut = mkDonut('tsharkDonut');
 
-// Line charts
-function mkLine(el, labels=[], datasetDefs=[]){
-  return new Chart(document.getElementById(el), {
+// no animation anywhere: redraws stay cheap on a Pi-hosted kiosk browser
+Chart.defaults.animation = false;
+
+// Fixed-capacity point buffer: new points are appended, the oldest dropped.
+// The array is shared with Chart.js and mutated in place, so no per-poll copies.
+// A late point (e.g. an agent replaying its spool) is inserted at its x position.
+class RingBuffer {
+  constructor(capacity){ this.capacity = capacity; this.data = []; }
+  push(points){
+    const d = this.data;
+    for(const p of points){
+      if(!d.length || p.x >= d[d.length-1].x){ d.push(p); continue; }
+      let lo = 0, hi = d.length;
+      while(lo < hi){ const m = (lo + hi) >> 1; if(d[m].x <= p.x) lo = m + 1; else hi = m; }
+      d.splice(lo, 0, p);
+    }
+    const over = d.length - this.capacity;
+    if(over > 0) d.splice(0, over);
+  }
+  clear(){ this.data.length = 0; }
+}
+
+function fmtTime(ms){ const d = new Date(ms); return d.toLocaleDateString([], {month:'2-digit', day:'2-digit'}) + ' ' + d.toLocaleTimeString([], {hour:'2-digit', minute:'2-digit'}); }
+function toMs(ts){ return new Date(String(ts).replace(' ', 'T')).getTime(); }
+
+// Line charts ({x: epoch ms, y} points, pre-parsed so decimation can run)
+function mkLine(el, labels){
+  const buffers = labels.map(() => new RingBuffer(720));
+  const chart = new Chart(document.getElementById(el), {
     type:'line',
-    data:{labels:labels, datasets: datasetDefs},
-    options:{responsive:true, maintainAspectRatio:false, plugins:{legend:{position:'top'}}, scales:{x:{ticks:{autoSkip:true,maxTicksLimit:10}}}}
+    data:{datasets: labels.map((l,i) => ({label:l, data:buffers[i].data, borderWidth:2, pointRadius:0, tension:0, fill:false}))},
+    options:{
+      responsive:true, maintainAspectRatio:false, parsing:false, normalized:true, spanGaps:true,
+      plugins:{legend:{position:'top'}, decimation:{enabled:true, algorithm:'lttb', samples:200}},
+      scales:{x:{type:'linear', ticks:{maxTicksLimit:10, callback:v => fmtTime(v)}}}
+    }
   });
+  return {chart, buffers};
 }
 
-const pingChart = mkLine('pingChart', [], [
-  {label:'Latency (ms)', data:[], borderWidth:2, tension:0.3, fill:false},
-  {label:'Loss (%)', data:[], borderWidth:2, tension:0.3, fill:false}
-]);
+const pingChart = mkLine('pingChart', ['Latency (ms)', 'Loss (%)']);
+const trafficChart = mkLine('trafficChart', ['Total Packets', 'Total Bytes']);
+const tsharkChart = mkLine('tsharkChart', ['TShark Packets', 'TShark Bytes']);
 
-const trafficChart = mkLine('trafficChart', [], [
-  {label:'Total Packets', data:[], borderWidth:2, tension:0.3, fill:false},
-  {label:'Total Bytes', data:[], borderWidth:2, tension:0.3, fill:false}
-]);
-
-const tsharkChart = mkLine('tsharkChart', [], [
-  {label:'TShark Packets', data:[], borderWidth:2, tension:0.3, fill:false},
-  {label:'TShark Bytes', data:[], borderWidth:2, tension:0.3, fill:false}
-]);
+const deviceChart = new Chart(document.getElementById('deviceChart'), {
+  type:'bar',
+  data:{labels:[], datasets:['TCP','UDP','ICMP','Other'].map((l,i)=>({label:l, data:[], backgroundColor:protoColors[i]}))},
+  options:{indexAxis:'y', responsive:true, maintainAspectRatio:false, plugins:{legend:{position:'top'}}, scales:{x:{stacked:true}, y:{stacked:true}}}
+});
 
 // fetch helpers
 async function fetchJson(url){ try{ const r=await fetch(url); return r.ok?await r.json():null } catch(e){ console.warn(e); return null } }
 
+// node filter (only shown when the dashboard reads a collector store)
+let selectedNode = '';
+let viewGen = 0;    // bumped on node change; responses fetched for an older view are dropped
+function isStale(gen, node){ return gen!==viewGen || node!==selectedNode; }
+function withNode(url){ return selectedNode ? `${url}?node=${encodeURIComponent(selectedNode)}` : url; }
+
+async function loadNodes(){
+  const nodes = await fetchJson('/api/nodes') || [];
+  if(nodes.length===0) return;
+  const sel = document.getElementById('node_select');
+  for(const n of nodes){
+    if([...sel.options].some(o => o.value===n)) continue;
+    const opt = document.createElement('option');
+    opt.value = n; opt.textContent = n;
+    sel.appendChild(opt);
+  }
+  document.getElementById('node_bar').style.display = 'block';
+}
+
 // Update functions (traffic uses merged_summary as source of truth)
-async function updateDonuts(){
+function updateDonuts(snap){
   // merged summary gives traffic (scapy fields) and ping
-  const merged = await fetchJson('/api/summary');
-  const latest = (merged && merged.length>0)? merged[merged.length-1] : null;
+  const latest = (snap.summary_latest && Object.keys(snap.summary_latest).length>0)? snap.summary_latest : null;
 
   // ping donut
   if(latest){
@@ -148,8 +216,8 @@ async function updateDonuts(){
     document.getElementById('traffic_kpi').innerText = `Total packets: ${total_packets} • Bytes: ${total_bytes||'N/A'}`;
   }
 
-  // tshark donut — call tshark API
-  const tshark_latest = await fetchJson('/api/tshark_latest');
+  // tshark donut
+  const tshark_latest = snap.tshark_latest;
   if(tshark_latest && Object.keys(tshark_latest).length>0){
     const ttcp=Number(tshark_latest.tcp||0), tudp=Number(tshark_latest.udp||0),
           ticmp=Number(tshark_latest.icmp||0), tother=Number(tshark_latest.other||0);
@@ -164,39 +232,86 @@ async function updateDonuts(){
   }
 }
 
+// only rows the server has not sent yet are requested and appended; the cursors are
+// opaque (a timestamp for local CSVs, an insertion rowid per node in collector mode)
+let seriesCursor = {summary: null, tshark: null};
+
+function appendRows(line, rows, fields){
+  fields.forEach((f,i) => line.buffers[i].push(rows.map(r => ({x: toMs(r.timestamp), y: Number(r[f]||0)}))));
+  line.chart.update('none');
+}
+
+function resetLines(){
+  for(const line of [pingChart, trafficChart, tsharkChart]){
+    line.buffers.forEach(b => b.clear());
+    line.chart.update('none');
+  }
+  seriesCursor = {summary: null, tshark: null};
+}
+
 async function updateLines(){
-  const merged = await fetchJson('/api/summary') || [];
-  const labels = merged.map(r => r.timestamp || '');
-  // ping lines
-  pingChart.data.labels = labels;
-  pingChart.data.datasets[0].data = merged.map(r => Number(r.latency_ms||0));
-  pingChart.data.datasets[1].data = merged.map(r => Number(r.loss_percent||0));
-  pingChart.update();
-
-  // traffic lines (Scapy totals)
-  trafficChart.data.labels = labels;
-  //trafficChart.data.datasets[0].data = merged.map(r => Number(r.total_packets||0));
-  trafficChart.data.datasets[0].data = merged.map(r => 
-    Number(r.tcp||0) + Number(r.udp||0) + Number(r.icmp||0) + Number(r.other||0)
-);
-  trafficChart.data.datasets[1].data = merged.map(r => Number(r.total_bytes||0));
-  trafficChart.update();
-
-  // tshark lines — use tshark summary endpoint
-  const tshark_summary = await fetchJson('/api/tshark_summary') || [];
-  const t_labels = tshark_summary.map(r => r.timestamp || '');
-  tsharkChart.data.labels = t_labels;
-  tsharkChart.data.datasets[0].data = tshark_summary.map(r => Number(r.total_pkts||0));
-  tsharkChart.data.datasets[1].data = tshark_summary.map(r => Number(r.total_bytes||0));
-  tsharkChart.update();
+  const gen = viewGen, node = selectedNode;
+  const params = new URLSearchParams();
+  if(selectedNode) params.set('node', selectedNode);
+  if(seriesCursor.summary !== null) params.set('summary_after', seriesCursor.summary);
+  if(seriesCursor.tshark !== null) params.set('tshark_after', seriesCursor.tshark);
+  const series = await fetchJson('/api/series' + (params.toString() ? `?${params}` : ''));
+  if(!series || isStale(gen, node)) return;
+  // "All nodes" aggregate comes whole each time it changed
+  if(series.replace) resetLines();
+  for(const line of [pingChart, trafficChart, tsharkChart]) line.buffers.forEach(b => b.capacity = series.window);
+
+  const summary = series.summary || [];
+  if(summary.length){
+    appendRows(pingChart, summary, ['latency_ms', 'loss_percent']);
+    appendRows(trafficChart, summary, ['total_pkts', 'total_bytes']);
+  }
+  const tshark = series.tshark || [];
+  if(tshark.length) appendRows(tsharkChart, tshark, ['total_pkts', 'total_bytes']);
+  seriesCursor = series.replace ? {summary: null, tshark: null} : series.cursor;
+}
+
+function updateDevices(snap){
+  const d = snap.devices || {};
+  const devices = d.devices || [];
+  deviceChart.data.labels = devices.map(r => `${r.name} (${r.subnet})`);
+  ['tcp','udp','icmp','other'].forEach((k,i) => {
+    deviceChart.data.datasets[i].data = devices.map(r => Number(r[k]||0));
+  });
+  deviceChart.update();
+  if(d.timestamp){
+    const subnets = (d.subnets || []).map(s => `${s.name}: ${s.total_pkts} pkts / ${s.total_bytes} B`).join(' • ');
+    document.getElementById('device_kpi').innerText = `${d.timestamp} (${d.source}) — ${subnets || 'no subnet traffic'}`;
+  }
+}
+
+// one snapshot per tick; server answers 304 / same version while nothing changed
+let lastVersion = null;
+async function refresh(){
+  if(document.hidden) return;   // no polling or drawing while the tab is not visible
+  const gen = viewGen, node = selectedNode;
+  const snap = await fetchJson(withNode('/api/dashboard'));
+  if(!snap || isStale(gen, node) || snap.version===lastVersion) return;
+  lastVersion = snap.version;
+  updateDonuts(snap);
+  updateDevices(snap);
+  await updateLines();
 }
 
 // initial + periodic
 window.addEventListener('load', ()=>{
-  updateDonuts();
-  updateLines();
-  setInterval(updateDonuts, 5000);
-  setInterval(updateLines, 15000);
+  document.getElementById('node_select').addEventListener('change', e => {
+    selectedNode = e.target.value;
+    viewGen++;
+    lastVersion = null;
+    resetLines();
+    refresh();
+  });
+  document.addEventListener('visibilitychange', () => { if(!document.hidden) refresh(); });
+  loadNodes();
+  setInterval(loadNodes, 60000);
+  refresh();
+  setInterval(refresh, 5000);
 });
 </script>
 </body>
@@ -226,6 +341,43 @@ def _load_csv_tail(path, tail=20, expected_cols=None):
         except Exception:
             return []
 
+    return _normalize_records(df, tail=tail, expected_cols=expected_cols)
+
+def _load_store_tail(table, node=None, tail=20, expected_cols=None):
+    """Same as _load_csv_tail but reads the collector store, optionally for one node."""
+    conn = _get_store()
+    if conn is None:
+        return []
+    recs = netwatch_store.query_tail(conn, table, node=node, tail=tail)
+    if not recs:
+        return []
+    return _normalize_records(pd.DataFrame(recs), tail=tail, expected_cols=expected_cols)
+
+_store = None
+
+def _get_store():
+    global _store
+    if _store is None and STORE_DB and os.path.exists(STORE_DB):
+        _store = netwatch_store.open_store(STORE_DB)
+    return _store
+
+def _load_tail(table, path, tail=20, expected_cols=None, node=None):
+    """Read from the collector store if configured (optionally one node), else from the local CSV."""
+    if STORE_DB:
+        return _load_store_tail(table, node=node, tail=tail, expected_cols=expected_cols)
+    return _load_csv_tail(path, tail=tail, expected_cols=expected_cols)
+
+def _node_arg():
+    """?node= as a cache key: None in CSV mode (no nodes there), 404 for names the store does not know."""
+    node = request.args.get("node") or None
+    if node is None or not STORE_DB:
+        return None
+    conn = _get_store()
+    if conn is None or not netwatch_store.has_node(conn, node):
+        abort(404, description=f"unknown node {node!r}")
+    return node
+
+def _normalize_records(df, tail=20, expected_cols=None):
     # normalize column names: lower-case & strip
     df.columns = [str(c).strip().lower() for c in df.columns]
 
@@ -236,7 +388,7 @@ def _load_csv_tail(path, tail=20, expected_cols=None):
                 df[c] = 0
 
     # coerce numeric
-    numcols = [c for c in df.columns if c not in ['timestamp','iface','interface']]
+    numcols = [c for c in df.columns if c not in ['timestamp','iface','interface','node','host','source','kind','name','subnet']]
     for c in numcols:
         try:
             df[c] = pd.to_numeric(df[c], errors='coerce').fillna(0)
@@ -261,6 +413,203 @@ def _load_csv_tail(path, tail=20, expected_cols=None):
                 rec[k] = v
     return records
 
+# --------------------
+# Record builders (shared by the single-panel APIs and the /api/dashboard snapshot)
+# --------------------
+# expected merged columns (as in merged main.py)
+SUMMARY_COLS = ["timestamp","latency_ms","jitter_ms","loss_percent",
+                "total_packets","tcp","udp","icmp","other","total_bytes",
+                "total_pkts","tshark_tcp","tshark_udp","tshark_icmp","tshark_other","tshark_bytes"]
+TRAFFIC_COLS = ["timestamp","iface","total_packets","tcp","udp","icmp","other","total_bytes"]
+TSHARK_COLS = ["timestamp","iface","capture_time_s","total_pkts","tcp","udp","icmp","other","total_bytes"]
+DEVICE_COLS = netwatch_store.SOURCES["devices"]["columns"]
+
+def _traffic_from_merged(r):
+    return {
+        "timestamp": r.get("timestamp",""),
+        "iface": r.get("iface",""),
+        "total_packets": int(r.get("total_packets",0)),
+        "tcp": int(r.get("tcp",0)),
+        "udp": int(r.get("udp",0)),
+        "icmp": int(r.get("icmp",0)),
+        "other": int(r.get("other",0)),
+        "total_bytes": int(r.get("total_bytes",0))
+    }
+
+def _tshark_from_merged(r):
+    return {
+        "timestamp": r.get("timestamp",""),
+        "iface": r.get("iface",""),
+        "total_pkts": int(r.get("total_pkts",0)),
+        "tcp": int(r.get("tshark_tcp", r.get("tcp",0))),
+        "udp": int(r.get("tshark_udp", r.get("udp",0))),
+        "icmp": int(r.get("tshark_icmp", r.get("icmp",0))),
+        "other": int(r.get("tshark_other", r.get("other",0))),
+        "total_bytes": int(r.get("tshark_bytes", r.get("total_bytes",0)))
+    }
+
+def _merged_raw(node=None, tail=20):
+    # without expected_cols, so the tshark_* fallbacks above still see missing columns as missing
+    return _load_tail('merged', MERGED_CSV, tail=tail, node=node)
+
+def _build_summary(node=None, merged=None):
+    if merged is None:
+        return _load_tail('merged', MERGED_CSV, tail=20, expected_cols=SUMMARY_COLS, node=node)
+    return [{**{c: 0 for c in SUMMARY_COLS}, **r} for r in merged]
+
+def _build_traffic(node=None, tail=20, merged=None):
+    recs = _load_tail('traffic', TRAFFIC_CSV, tail=tail, expected_cols=TRAFFIC_COLS, node=node)
+    # if traffic file empty, fallback to merged csv traffic fields
+    if not recs:
+        if merged is None:
+            merged = _merged_raw(node, tail=tail)
+        recs = [_traffic_from_merged(r) for r in merged[-tail:]]
+    return recs
+
+def _build_tshark(node=None, tail=20, merged=None):
+    recs = _load_tail('tshark', TSHARK_CSV, tail=tail, expected_cols=TSHARK_COLS, node=node)
+    # fallback to merged tshark fields if present
+    if not recs:
+        if merged is None:
+            merged = _merged_raw(node, tail=tail)
+        recs = [_tshark_from_merged(r) for r in merged[-tail:]]
+    return recs
+
+def _build_devices(node=None, top=10):
+    """Per-device / per-subnet counters of the latest capture window."""
+    recs = _load_tail('devices', DEVICE_CSV, tail=500, expected_cols=DEVICE_COLS, node=node)
+    if not recs:
+        return {}
+    # both probes append to the same file: stick to one of them so the panel does not flip
+    sources = {r["source"] for r in recs}
+    source = DEVICE_SOURCE if DEVICE_SOURCE in sources else recs[-1]["source"]
+    recs = [r for r in recs if r["source"] == source]
+    last = recs[-1]
+    window = [r for r in recs if r["timestamp"] == last["timestamp"]]
+    devices = sorted((r for r in window if r["kind"] == "device"), key=lambda r: -r["total_bytes"])
+    return {
+        "timestamp": last["timestamp"],
+        "source": source,
+        "devices": devices[:top],
+        "subnets": [r for r in window if r["kind"] == "subnet"],
+    }
+
+# --------------------
+# Dashboard snapshot: built once per data change, shared by all clients
+# --------------------
+_cache = {}     # (kind, node) -> (version, value)
+_cache_lock = threading.Lock()
+SERIES_WINDOW = 720     # rows kept for the line charts (12 h of 60 s probe cycles)
+
+def _source_signature(node=None):
+    """Cheap fingerprint of the data sources; the snapshot is rebuilt only when it changes."""
+    if STORE_DB:
+        conn = _get_store()
+        if conn is None:
+            return ("store", node, None)
+        # a node's snapshot only changes with that node's batches; "All nodes" with any batch
+        if node:
+            last = conn.execute("SELECT MAX(rowid) FROM batches WHERE node = ?", (node,)).fetchone()[0]
+        else:
+            last = conn.execute("SELECT MAX(rowid) FROM batches").fetchone()[0]
+        return ("store", node, last)
+    sig = []
+    for path in (MERGED_CSV, TRAFFIC_CSV, TSHARK_CSV, DEVICE_CSV):
+        try:
+            st = os.stat(path)
+            sig.append((path, st.st_mtime_ns, st.st_size))
+        except OSError:
+            sig.append((path, None, None))
+    return tuple(sig)
+
+def _build_snapshot(node=None):
+    # donuts and KPIs only need the latest rows; the line charts come from /api/series
+    merged = _merged_raw(node, tail=1)
+    summary = _build_summary(node, merged=merged)
+    tshark = _build_tshark(node, tail=1, merged=merged)
+    return {
+        "summary_latest": summary[-1] if summary else {},
+        "tshark_latest": tshark[-1] if tshark else {},
+        "devices": _build_devices(node),
+    }
+
+def _series_rows(merged, tshark):
+    """Trim rows to the plotted fields; drop rows whose timestamp is unusable."""
+    summary = [{
+        "timestamp": r["timestamp"],
+        "latency_ms": r["latency_ms"],
+        "loss_percent": r["loss_percent"],
+        "total_pkts": r["tcp"] + r["udp"] + r["icmp"] + r["other"],
+        "total_bytes": r["total_bytes"],
+    } for r in merged]
+    tshark = [{k: r[k] for k in ("timestamp", "total_pkts", "total_bytes")} for r in tshark]
+    # rows after a power loss can start with NUL padding or lose the timestamp
+    for rows in (summary, tshark):
+        for r in rows:
+            r["timestamp"] = str(r["timestamp"]).strip("\x00 \r")
+        rows[:] = [r for r in rows if len(r["timestamp"]) >= 19]
+    return summary, tshark
+
+def _build_series(node=None):
+    """
+    Line chart rows of the last SERIES_WINDOW cycles (CSV files, or the per-minute
+    "All nodes" aggregate of the store), sorted by timestamp.
+    """
+    merged = _load_tail('merged', MERGED_CSV, tail=SERIES_WINDOW, expected_cols=SUMMARY_COLS, node=node)
+    summary, tshark = _series_rows(merged, _build_tshark(node, tail=SERIES_WINDOW))
+    for rows in (summary, tshark):
+        rows.sort(key=lambda r: r["timestamp"])
+    return {
+        "summary": summary,
+        "summary_ts": [r["timestamp"] for r in summary],
+        "tshark": tshark,
+        "tshark_ts": [r["timestamp"] for r in tshark],
+    }
+
+def _rows_since(rows, timestamps, since):
+    # CSV files are appended in time order, so a timestamp cursor is enough there
+    return rows[bisect_right(timestamps, since):] if since else rows
+
+def _store_series_after(node, cursors):
+    """Rows of one node stored after the given rowid cursors (insertion order, late rows included)."""
+    conn = _get_store()
+    out, new_cursors = {}, {}
+    for key, table in (("summary", "merged"), ("tshark", "tshark")):
+        try:
+            after = int(cursors[key]) if cursors.get(key) else None
+        except ValueError:
+            abort(400, description=f"bad cursor for {key}")
+        recs, new_cursors[key] = netwatch_store.query_after(conn, table, node, after, limit=SERIES_WINDOW)
+        out[key] = _normalize_records(pd.DataFrame(recs), tail=SERIES_WINDOW,
+                                      expected_cols=SUMMARY_COLS if table == "merged" else TSHARK_COLS) if recs else []
+    summary, tshark = _series_rows(out["summary"], out["tshark"])
+    return summary, tshark, new_cursors
+
+def _cached(kind, node, build):
+    """Return (version, value), calling build(node, version) only when the sources changed."""
+    version = hashlib.sha1(repr(_source_signature(node)).encode()).hexdigest()[:16]
+    cached = _cache.get((kind, node))
+    if cached and cached[0] == version:
+        return cached
+    with _cache_lock:
+        # another request may have rebuilt it while we waited
+        cached = _cache.get((kind, node))
+        if cached and cached[0] == version:
+            return cached
+        cached = (version, build(node, version))
+        _cache[(kind, node)] = cached
+        return cached
+
+def _serialize_snapshot(node, version):
+    snap = _build_snapshot(node)
+    snap["version"] = version
+    raw = json.dumps(snap, separators=(",", ":")).encode("utf-8")
+    return raw, gzip.compress(raw, compresslevel=6)
+
+def _get_snapshot(node=None):
+    version, (raw, gz) = _cached("snapshot", node, _serialize_snapshot)
+    return version, raw, gz
+
 # --------------------
 # Routes
 # --------------------
@@ -268,98 +617,85 @@ def _load_csv_tail(path, tail=20, expected_cols=None):
 def index():
     return render_template_string(TEMPLATE)
 
+@app.route('/api/dashboard')
+def api_dashboard():
+    version, raw, gz = _get_snapshot(_node_arg())
+    etag = f'"{version}"'
+    if etag in request.headers.get("If-None-Match", ""):
+        return Response(status=304, headers={"ETag": etag})
+    use_gzip = "gzip" in request.headers.get("Accept-Encoding", "")
+    resp = Response(gz if use_gzip else raw, mimetype="application/json")
+    if use_gzip:
+        resp.headers["Content-Encoding"] = "gzip"
+    resp.headers["Vary"] = "Accept-Encoding"
+    resp.headers["ETag"] = etag
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
+
+@app.route('/api/series')
+def api_series():
+    """
+    Line chart rows newer than the client's cursors (?summary_after=&tshark_after=).
+    Cursors are opaque: a timestamp for the local CSVs, a store rowid for one node.
+    "All nodes" is an aggregate whose minutes still change as agents catch up, so it
+    is sent whole (replace=true) whenever the store changed.
+    """
+    node = _node_arg()
+    cursors = {"summary": request.args.get("summary_after"), "tshark": request.args.get("tshark_after")}
+    if STORE_DB and node:
+        summary, tshark, new_cursors = _store_series_after(node, cursors)
+        replace = False
+    else:
+        version, series = _cached("series", node, lambda node, _: _build_series(node))
+        if STORE_DB:
+            summary, tshark, replace = series["summary"], series["tshark"], True
+            new_cursors = {"summary": version, "tshark": version}
+        else:
+            summary = _rows_since(series["summary"], series["summary_ts"], cursors["summary"])
+            tshark = _rows_since(series["tshark"], series["tshark_ts"], cursors["tshark"])
+            replace = False
+            new_cursors = {
+                "summary": series["summary_ts"][-1] if series["summary_ts"] else cursors["summary"],
+                "tshark": series["tshark_ts"][-1] if series["tshark_ts"] else cursors["tshark"],
+            }
+    return jsonify({
+        "window": SERIES_WINDOW,
+        "replace": replace,
+        "cursor": new_cursors,
+        "summary": summary,
+        "tshark": tshark,
+    })
+
 @app.route('/api/summary')
 def api_summary():
-    # expected merged columns (as in merged main.py)
-    expected = ["timestamp","latency_ms","jitter_ms","loss_percent",
-                "total_packets","tcp","udp","icmp","other","total_bytes",
-                "total_pkts","tshark_tcp","tshark_udp","tshark_icmp","tshark_other","tshark_bytes"]
-    recs = _load_csv_tail(MERGED_CSV, tail=20, expected_cols=expected)
-    return jsonify(recs)
+    return jsonify(_build_summary(_node_arg()))
 
 @app.route('/api/traffic_summary')
 def api_traffic_summary():
-    expected = ["timestamp","iface","total_packets","tcp","udp","icmp","other","total_bytes"]
-    recs = _load_csv_tail(TRAFFIC_CSV, tail=20, expected_cols=expected)
-    # if traffic file empty, fallback to merged csv traffic fields
-    if not recs:
-        merged = _load_csv_tail(MERGED_CSV, tail=20, expected_cols=None)
-        # map merged fields to traffic fields if present
-        recs = []
-        for r in merged:
-            recs.append({
-                "timestamp": r.get("timestamp",""),
-                "iface": r.get("iface",""),
-                "total_packets": int(r.get("total_packets",0)),
-                "tcp": int(r.get("tcp",0)),
-                "udp": int(r.get("udp",0)),
-                "icmp": int(r.get("icmp",0)),
-                "other": int(r.get("other",0)),
-                "total_bytes": int(r.get("total_bytes",0))
-            })
-    return jsonify(recs)
+    return jsonify(_build_traffic(_node_arg()))
 
 @app.route('/api/traffic_latest')
 def api_traffic_latest():
-    recs = _load_csv_tail(TRAFFIC_CSV, tail=1, expected_cols=["timestamp","iface","total_packets","tcp","udp","icmp","other","total_bytes"])
-    if recs:
-        return jsonify(recs[-1])
-    # fallback to merged
-    merged = _load_csv_tail(MERGED_CSV, tail=1)
-    if merged:
-        m = merged[-1]
-        return jsonify({
-            "timestamp": m.get("timestamp",""),
-            "iface": m.get("iface",""),
-            "total_packets": int(m.get("total_packets",0)),
-            "tcp": int(m.get("tcp",0)),
-            "udp": int(m.get("udp",0)),
-            "icmp": int(m.get("icmp",0)),
-            "other": int(m.get("other",0)),
-            "total_bytes": int(m.get("total_bytes",0))
-        })
-    return jsonify({})
+    recs = _build_traffic(_node_arg(), tail=1)
+    return jsonify(recs[-1] if recs else {})
 
 @app.route('/api/tshark_summary')
 def api_tshark_summary():
-    expected = ["timestamp","iface","capture_time_s","total_pkts","tcp","udp","icmp","other","total_bytes"]
-    recs = _load_csv_tail(TSHARK_CSV, tail=20, expected_cols=expected)
-    # fallback to merged tshark fields if present
-    if not recs:
-        merged = _load_csv_tail(MERGED_CSV, tail=20)
-        recs = []
-        for r in merged:
-            recs.append({
-                "timestamp": r.get("timestamp",""),
-                "iface": r.get("iface",""),
-                "total_pkts": int(r.get("total_pkts",0)),
-                "tcp": int(r.get("tshark_tcp", r.get("tcp",0))),
-                "udp": int(r.get("tshark_udp", r.get("udp",0))),
-                "icmp": int(r.get("tshark_icmp", r.get("icmp",0))),
-                "other": int(r.get("tshark_other", r.get("other",0))),
-                "total_bytes": int(r.get("tshark_bytes", r.get("total_bytes",0)))
-            })
-    return jsonify(recs)
+    return jsonify(_build_tshark(_node_arg()))
 
 @app.route('/api/tshark_latest')
 def api_tshark_latest():
-    recs = _load_csv_tail(TSHARK_CSV, tail=1, expected_cols=["timestamp","iface","capture_time_s","total_pkts","tcp","udp","icmp","other","total_bytes"])
-    if recs:
-        return jsonify(recs[-1])
-    merged = _load_csv_tail(MERGED_CSV, tail=1)
-    if merged:
-        r = merged[-1]
-        return jsonify({
-            "timestamp": r.get("timestamp",""),
-            "iface": r.get("iface",""),
-            "total_pkts": int(r.get("total_pkts",0)),
-            "tcp": int(r.get("tshark_tcp", r.get("tcp",0))),
-            "udp": int(r.get("tshark_udp", r.get("udp",0))),
-            "icmp": int(r.get("tshark_icmp", r.get("icmp",0))),
-            "other": int(r.get("tshark_other", r.get("other",0))),
-            "total_bytes": int(r.get("tshark_bytes", r.get("total_bytes",0)))
-        })
-    return jsonify({})
+    recs = _build_tshark(_node_arg(), tail=1)
+    return jsonify(recs[-1] if recs else {})
+
+@app.route('/api/devices')
+def api_devices():
+    return jsonify(_build_devices(_node_arg()))
+
+@app.route('/api/nodes')
+def api_nodes():
+    conn = _get_store()
+    return jsonify(netwatch_store.list_nodes(conn) if conn is not None else [])
 
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=3000, debug=False)
@@ -0,0 +1,133 @@
+from bisect import bisect_right
+import ipaddress
+import json
+import os
+
+# -------------------------
+# CONFIG
+# -------------------------
+DEVICES_FILE = "devices.json"       # see devices.example.json
+DEVICE_CSV = "data/device_probe.csv"
+CACHE_SIZE = 4096                   # addresses remembered between lookups
+
+DEVICE_HEADER = ["timestamp", "source", "kind", "name", "subnet", "total_pkts", "tcp", "udp", "icmp", "other", "total_bytes"]
+
+# -------------------------
+# LONGEST-PREFIX-MATCH INDEX
+# -------------------------
+def _compile_intervals(prefixes):
+    """
+    Flatten (possibly nested) prefixes into sorted, non-overlapping intervals where each
+    interval carries the name of its most specific prefix. Lookup is then one bisect.
+    """
+    if not prefixes:
+        return [], [], []
+    bounds = sorted({p[0] for p in prefixes} | {p[1] + 1 for p in prefixes})
+    starts, ends, names = [], [], []
+    for lo, hi in zip(bounds, bounds[1:]):
+        best = None
+        for start, end, plen, name in prefixes:
+            if start <= lo and hi - 1 <= end and (best is None or plen > best[0]):
+                best = (plen, name)
+        if best is None:
+            continue
+        if names and names[-1] == best[1] and ends[-1] + 1 == lo:
+            ends[-1] = hi - 1       # merge with the previous interval
+        else:
+            starts.append(lo)
+            ends.append(hi - 1)
+            names.append(best[1])
+    return starts, ends, names
+
+class DeviceIndex:
+    """Maps packet endpoints to LAN devices and subnets. Built once, looked up per packet."""
+
+    def __init__(self, subnets=None, hosts=None, macs=None):
+        prefixes = {4: [], 6: []}
+        for cidr, name in (subnets or {}).items():
+            net = ipaddress.ip_network(cidr, strict=False)
+            prefixes[net.version].append((int(net.network_address), int(net.broadcast_address), net.prefixlen, name))
+        self._tables = {v: _compile_intervals(p) for v, p in prefixes.items()}
+        self.hosts = dict(hosts or {})
+        self.macs = {m.lower(): n for m, n in (macs or {}).items()}
+        self._cache = {}
+
+    @classmethod
+    def from_file(cls, path=DEVICES_FILE):
+        """Load the index from a JSON config, or return None if there is no config."""
+        if not path or not os.path.exists(path):
+            return None
+        with open(path) as f:
+            cfg = json.load(f)
+        return cls(cfg.get("subnets"), cfg.get("hosts"), cfg.get("macs"))
+
+    def subnet_of(self, ip):
+        """Name of the most specific configured subnet containing ip, or None."""
+        try:
+            addr = ipaddress.ip_address(ip)
+        except ValueError:
+            return None
+        starts, ends, names = self._tables[addr.version]
+        value = int(addr)
+        i = bisect_right(starts, value) - 1
+        if i >= 0 and value <= ends[i]:
+            return names[i]
+        return None
+
+    def lookup(self, ip, mac=None):
+        """(device name, subnet name) for a LAN endpoint, or None if ip is outside every configured subnet."""
+        key = (ip, mac)
+        hit = self._cache.get(key)
+        if hit is not None or key in self._cache:
+            return hit
+        subnet = self.subnet_of(ip) if ip else None
+        if subnet is None:
+            result = None
+        else:
+            # explicit IP names first: a routed packet carries the router's MAC, not the device's
+            name = self.hosts.get(ip) or (self.macs.get(mac.lower()) if mac else None)
+            result = (name or ip, subnet)
+        if len(self._cache) >= CACHE_SIZE:
+            self._cache.clear()
+        self._cache[key] = result
+        return result
+
+# -------------------------
+# PER-WINDOW ACCOUNTING
+# -------------------------
+def _empty():
+    return {"total_pkts": 0, "tcp": 0, "udp": 0, "icmp": 0, "other": 0, "total_bytes": 0}
+
+class DeviceAccounting:
+    """Byte/packet/protocol counters per device and per subnet for one capture window."""
+
+    def __init__(self, index):
+        self.index = index
+        self.devices = {}   # (name, subnet) -> counters
+        self.subnets = {}   # subnet -> counters
+
+    def add(self, proto, length, src_ip=None, dst_ip=None, src_mac=None, dst_mac=None):
+        # a packet between two LAN devices counts once for each of them, once per subnet
+        seen_subnets = set()
+        for ip, mac in ((src_ip, src_mac), (dst_ip, dst_mac)):
+            hit = self.index.lookup(ip, mac)
+            if hit is None:
+                continue
+            _count(self.devices.setdefault(hit, _empty()), proto, length)
+            if hit[1] not in seen_subnets:
+                seen_subnets.add(hit[1])
+                _count(self.subnets.setdefault(hit[1], _empty()), proto, length)
+
+    def rows(self, timestamp, source):
+        """CSV rows (DEVICE_HEADER order) for this window."""
+        out = []
+        for (name, subnet), c in sorted(self.devices.items(), key=lambda kv: -kv[1]["total_bytes"]):
+            out.append([timestamp, source, "device", name, subnet] + [c[k] for k in DEVICE_HEADER[5:]])
+        for subnet, c in sorted(self.subnets.items()):
+            out.append([timestamp, source, "subnet", subnet, subnet] + [c[k] for k in DEVICE_HEADER[5:]])
+        return out
+
+def _count(c, proto, length):
+    c["total_pkts"] += 1
+    c[proto] += 1
+    c["total_bytes"] += length
@@ -0,0 +1,189 @@
+from datetime import datetime, timedelta
+import sqlite3
+import threading
+
+# -------------------------
+# CONFIG
+# -------------------------
+DEFAULT_DB = "data/netwatch.db"
+RETENTION_DAYS = 30         # rows (and batch ids) older than this are pruned; 0 keeps everything
+
+# Column order of each CSV exactly as the probes write the rows
+# (traffic_probe.py writes the iface column even though its header does not have it)
+SOURCES = {
+    "ping": {
+        "file": "ping_probe.csv",
+        "columns": ["timestamp", "host", "latency_ms", "jitter_ms", "loss_percent"],
+    },
+    "traffic": {
+        "file": "traffic_probe.csv",
+        "columns": ["timestamp", "iface", "total_packets", "tcp", "udp", "icmp", "other", "total_bytes"],
+    },
+    "tshark": {
+        "file": "tshark_probe.csv",
+        "columns": ["timestamp", "iface", "capture_time_s", "total_pkts", "tcp", "udp", "icmp", "other", "total_bytes"],
+    },
+    "merged": {
+        "file": "merged_summary.csv",
+        "columns": ["timestamp", "latency_ms", "jitter_ms", "loss_percent", "total_bytes", "total_pkts", "tcp", "udp", "icmp", "other"],
+    },
+    "devices": {
+        "file": "device_probe.csv",
+        "columns": ["timestamp", "source", "kind", "name", "subnet", "total_pkts", "tcp", "udp", "icmp", "other", "total_bytes"],
+    },
+}
+
+TEXT_COLUMNS = ("timestamp", "host", "iface", "source", "kind", "name", "subnet")
+
+# "All nodes" view: rows are merged per minute across nodes
+AVG_COLUMNS = ("latency_ms", "jitter_ms", "loss_percent", "capture_time_s")
+GROUP_COLUMNS = {"devices": ["source", "kind", "name", "subnet"]}   # kept apart inside a minute
+
+# -------------------------
+# HELPERS
+# -------------------------
+def open_store(path=DEFAULT_DB):
+    # one shared connection, WAL so the dashboard can read while the collector writes
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    for table, src in SOURCES.items():
+        cols = ", ".join(f"{c} {'TEXT' if c in TEXT_COLUMNS else 'REAL'}" for c in src["columns"])
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (node TEXT NOT NULL, {cols})")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_node_ts ON {table} (node, timestamp)")
+        # "All nodes" window and retention work on timestamp ranges across nodes
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_ts ON {table} (timestamp)")
+    # batch ids already ingested, so an agent retrying after a lost response does not duplicate rows
+    conn.execute("CREATE TABLE IF NOT EXISTS batches (batch_id TEXT PRIMARY KEY, node TEXT, received_at TEXT)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_batches_node ON batches (node)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_batches_received ON batches (received_at)")
+    conn.commit()
+    return conn
+
+_write_lock = threading.Lock()
+
+def insert_batch(conn, node, batch_id, records, received_at):
+    """Insert one agent batch in a single transaction. Returns number of rows stored (0 if duplicate)."""
+    stored = 0
+    with _write_lock:
+        try:
+            with conn:
+                cur = conn.execute("INSERT OR IGNORE INTO batches VALUES (?, ?, ?)", (batch_id, node, received_at))
+                if cur.rowcount == 0:
+                    return 0
+                for table, rows in records.items():
+                    if table not in SOURCES or not rows:
+                        continue
+                    columns = SOURCES[table]["columns"]
+                    placeholders = ", ".join("?" * (len(columns) + 1))
+                    conn.executemany(
+                        f"INSERT INTO {table} (node, {', '.join(columns)}) VALUES ({placeholders})",
+                        ([node] + [_to_value(c, row.get(c)) for c in columns] for row in rows),
+                    )
+                    stored += len(rows)
+        except sqlite3.Error as e:
+            print(f"Error storing batch {batch_id} from {node}: {e}")
+            raise
+    return stored
+
+def _to_value(column, value):
+    if value is None or value == "":
+        return None
+    if column in TEXT_COLUMNS:
+        return str(value)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def list_nodes(conn):
+    rows = conn.execute("SELECT DISTINCT node FROM batches ORDER BY node").fetchall()
+    return [r[0] for r in rows]
+
+def has_node(conn, node):
+    return conn.execute("SELECT 1 FROM batches WHERE node = ? LIMIT 1", (node,)).fetchone() is not None
+
+def query_tail(conn, table, node=None, tail=20):
+    """
+    Return the last `tail` rows of a table (oldest first) for one node.
+    Without a node, rows of all nodes are aggregated per minute (counters summed,
+    latency/jitter/loss averaged) so every timestamp appears once.
+    """
+    if table not in SOURCES:
+        return []
+    if not node:
+        return _query_tail_all(conn, table, tail)
+    columns = ["node"] + SOURCES[table]["columns"]
+    sql = f"SELECT {', '.join(columns)} FROM {table} WHERE node = ? ORDER BY timestamp DESC LIMIT ?"
+    rows = conn.execute(sql, (node, tail)).fetchall()
+    return [dict(zip(columns, r)) for r in reversed(rows)]
+
+def query_after(conn, table, node, after=None, limit=20):
+    """
+    Rows of one node in insertion order, for incremental readers. Returns (rows, cursor).
+    Without `after` it returns the last `limit` rows by timestamp; pass the returned cursor
+    (a rowid) next time to get only rows stored since, whatever their timestamp.
+    """
+    if table not in SOURCES:
+        return [], after
+    columns = ["node"] + SOURCES[table]["columns"]
+    if after is None:
+        # cursor first, so rows stored while we read are picked up next time
+        cursor = conn.execute(f"SELECT MAX(rowid) FROM {table} WHERE node = ?", (node,)).fetchone()[0] or 0
+        sql = f"SELECT {', '.join(columns)} FROM {table} WHERE node = ? AND rowid <= ? ORDER BY timestamp DESC LIMIT ?"
+        rows = list(reversed(conn.execute(sql, (node, cursor, limit)).fetchall()))
+        return [dict(zip(columns, r)) for r in rows], cursor
+    sql = f"SELECT rowid, {', '.join(columns)} FROM {table} WHERE node = ? AND rowid > ? ORDER BY rowid LIMIT ?"
+    rows = conn.execute(sql, (node, after, limit)).fetchall()
+    cursor = rows[-1][0] if rows else after
+    return [dict(zip(columns, r[1:])) for r in rows], cursor
+
+def prune(conn, days=RETENTION_DAYS, now=None):
+    """Delete rows and batch ids older than `days`. Returns number of rows deleted."""
+    if not days:
+        return 0
+    cutoff = ((now or datetime.now()) - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+    deleted = 0
+    with _write_lock:
+        with conn:
+            for table in SOURCES:
+                deleted += conn.execute(f"DELETE FROM {table} WHERE timestamp < ?", (cutoff,)).rowcount
+            # a batch older than the retention will not be retried any more
+            conn.execute("DELETE FROM batches WHERE received_at < ?", (cutoff,))
+    return deleted
+
+def _window_start(conn, table, minutes):
+    """Start of the last `minutes` minutes of data, from MAX(timestamp) (one index lookup)."""
+    last = conn.execute(f"SELECT MAX(timestamp) FROM {table}").fetchone()[0]
+    if not last:
+        return None
+    try:
+        last = datetime.strptime(last[:16], "%Y-%m-%d %H:%M")
+    except ValueError:
+        last = datetime.now()
+    return (last - timedelta(minutes=minutes - 1)).strftime("%Y-%m-%d %H:%M")
+
+def _query_tail_all(conn, table, tail):
+    # at most one row per minute (per group), so the last `tail` minutes are enough
+    start = _window_start(conn, table, tail)
+    if start is None:
+        return []
+    group = GROUP_COLUMNS.get(table, [])
+    select = []
+    for c in SOURCES[table]["columns"]:
+        if c == "timestamp":
+            select.append("substr(timestamp, 1, 16) || ':00'")
+        elif c in group:
+            select.append(c)
+        elif c in TEXT_COLUMNS:
+            select.append("'all'")
+        elif c in AVG_COLUMNS:
+            select.append(f"AVG({c})")
+        else:
+            select.append(f"SUM({c})")
+    group_by = ", ".join(["substr(timestamp, 1, 16)"] + group)
+    sql = (f"SELECT {', '.join(select)} FROM {table} WHERE timestamp >= ? GROUP BY {group_by} "
+           f"ORDER BY substr(timestamp, 1, 16) DESC LIMIT ?")
+    rows = conn.execute(sql, (start, tail)).fetchall()
+    columns = SOURCES[table]["columns"]
+    return [dict(zip(columns, r), node="all") for r in reversed(rows)]
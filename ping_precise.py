@@ -0,0 +1,183 @@
+import socket
+import select
+import struct
+import time
+import os
+
+# -------------------------
+# CONFIG
+# -------------------------
+# Linux values (not every Python build exposes them in the socket module)
+SO_TIMESTAMPNS = getattr(socket, "SO_TIMESTAMPNS", 35)
+SO_TIMESTAMPING = getattr(socket, "SO_TIMESTAMPING", 37)
+SCM_TIMESTAMPNS = SO_TIMESTAMPNS
+SCM_TIMESTAMPING = SO_TIMESTAMPING
+MSG_ERRQUEUE = getattr(socket, "MSG_ERRQUEUE", 0x2000)
+
+# SOF_TIMESTAMPING_* flags from linux/net_tstamp.h
+SOF_TX_SOFTWARE = 1 << 1
+SOF_RX_SOFTWARE = 1 << 3
+SOF_SOFTWARE = 1 << 4
+SOF_OPT_TSONLY = 1 << 11
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+
+# next ICMP seq; keeps increasing across calls so a late reply from an earlier
+# (possibly sub-second) cycle can never match a probe of the current one
+_next_seq = int(time.time()) & 0xFFFF
+
+TIMESPEC = struct.Struct("@ll")     # struct timespec {time_t tv_sec; long tv_nsec;}
+SCM_TS_SIZE = TIMESPEC.size * 3     # struct scm_timestamping {struct timespec ts[3];}
+
+# -------------------------
+# HELPERS
+# -------------------------
+def checksum(data):
+    if len(data) % 2:
+        data += b"\0"
+    s = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    s = (s >> 16) + (s & 0xFFFF)
+    s += s >> 16
+    return ~s & 0xFFFF
+
+def build_echo(ident, seq, payload=b"pi-netwatch-precise"):
+    header = struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, 0, ident, seq)
+    csum = checksum(header + payload)
+    return struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, csum, ident, seq) + payload
+
+def open_socket():
+    """Raw ICMP socket with kernel timestamps. Returns (sock, mode): mode is 'timestamping' or 'timestampns'."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP)
+    try:
+        flags = SOF_TX_SOFTWARE | SOF_RX_SOFTWARE | SOF_SOFTWARE | SOF_OPT_TSONLY
+        sock.setsockopt(socket.SOL_SOCKET, SO_TIMESTAMPING, flags)
+        return sock, "timestamping"
+    except OSError:
+        # older kernel: receive timestamps only, send time taken in user space
+        sock.setsockopt(socket.SOL_SOCKET, SO_TIMESTAMPNS, 1)
+        return sock, "timestampns"
+
+def kernel_ts_ns(ancdata):
+    """Software kernel timestamp (ns, CLOCK_REALTIME) from recvmsg ancillary data, or None."""
+    for level, ctype, data in ancdata:
+        if level != socket.SOL_SOCKET:
+            continue
+        if ctype == SCM_TIMESTAMPING and len(data) >= SCM_TS_SIZE:
+            sec, nsec = TIMESPEC.unpack_from(data, 0)    # ts[0] = software timestamp
+            if sec or nsec:
+                return sec * 1_000_000_000 + nsec
+        elif ctype == SCM_TIMESTAMPNS and len(data) >= TIMESPEC.size:
+            sec, nsec = TIMESPEC.unpack_from(data, 0)
+            return sec * 1_000_000_000 + nsec
+    return None
+
+def read_tx_timestamps(sock):
+    """Drain the error queue; TX timestamps come back in send order."""
+    stamps = []
+    while True:
+        try:
+            _, ancdata, _, _ = sock.recvmsg(64, socket.CMSG_SPACE(SCM_TS_SIZE) + 512, MSG_ERRQUEUE | socket.MSG_DONTWAIT)
+        except (BlockingIOError, InterruptedError):
+            return stamps
+        ts = kernel_ts_ns(ancdata)
+        if ts is not None:
+            stamps.append(ts)
+
+def parse_reply(packet, ident):
+    """Return ICMP seq if packet is an echo reply for our ident, else None."""
+    ihl = (packet[0] & 0x0F) * 4
+    if len(packet) < ihl + 8:
+        return None
+    icmp_type, _, _, rid, seq = struct.unpack("!BBHHH", packet[ihl:ihl + 8])
+    if icmp_type != ICMP_ECHO_REPLY or rid != ident:
+        return None
+    return seq
+
+# ========================
+# MEASURE FUNCTION
+# ========================
+def measure_ping_precise(host, count=5, gap=1.0, timeout=2.0):
+    """
+    Send `count` echo requests `gap` seconds apart (gap may be well below 1 s for bursts)
+    and time them with kernel send/receive timestamps.
+    Returns dict: latencies (ms, kernel RTT), overheads (ms, user-space RTT minus kernel RTT), sent, ts_source.
+    """
+    addr = socket.gethostbyname(host)
+    sock, mode = open_socket()
+    global _next_seq
+    ident = os.getpid() & 0xFFFF
+    base_seq = _next_seq
+    _next_seq = (_next_seq + count) & 0xFFFF
+
+    # seq -> [user_send_ns, kernel_tx_ns or None]
+    sent = {}
+    pending_tx = []     # seqs still waiting for their TX timestamp (FIFO)
+    results = {}        # seq -> (rtt_ms, overhead_ms)
+    used_user_tx = False
+
+    def collect_tx():
+        for ts in read_tx_timestamps(sock):
+            if pending_tx:
+                sent[pending_tx.pop(0)][1] = ts
+
+    def receive_until(deadline, stop_when_done=False):
+        nonlocal used_user_tx
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or (stop_when_done and len(results) == len(sent)):
+                return
+            ready, _, _ = select.select([sock], [], [], remaining)
+            if not ready:
+                return
+            # select also wakes for a TX timestamp on the error queue only: drain it and never block here
+            collect_tx()
+            try:
+                packet, ancdata, _, _ = sock.recvmsg(2048, socket.CMSG_SPACE(SCM_TS_SIZE) + 512, socket.MSG_DONTWAIT)
+            except BlockingIOError:
+                continue
+            except OSError as e:
+                # e.g. host unreachable reported on the socket; the probe simply counts as lost
+                print(f"ICMP socket error: {e}")
+                continue
+            user_rx = time.time_ns()
+            seq = parse_reply(packet, ident)
+            if seq is None or seq not in sent or seq in results:
+                continue
+            user_tx, kernel_tx = sent[seq]
+            kernel_rx = kernel_ts_ns(ancdata)
+            if kernel_tx is None:
+                kernel_tx = user_tx
+                used_user_tx = True
+            if kernel_rx is None:
+                kernel_rx = user_rx
+            rtt = kernel_rx - kernel_tx
+            results[seq] = (rtt / 1e6, ((user_rx - user_tx) - rtt) / 1e6)
+
+    try:
+        start = time.monotonic()
+        for i in range(count):
+            seq = (base_seq + i) & 0xFFFF
+            # wait for the send slot, handling replies that arrive meanwhile
+            receive_until(start + i * gap)
+            sent[seq] = [time.time_ns(), None]
+            sock.sendto(build_echo(ident, seq), (addr, 0))
+            if mode == "timestamping":
+                pending_tx.append(seq)
+                collect_tx()
+        receive_until(time.monotonic() + timeout, stop_when_done=True)
+    finally:
+        sock.close()
+
+    # keep send order so jitter compares consecutive probes
+    answered = [results[seq] for seq in sent if seq in results]
+    if mode == "timestampns" or used_user_tx:
+        ts_source = "kernel-rx"
+    else:
+        ts_source = "kernel-tx-rx"
+    return {
+        "latencies": [r[0] for r in answered],
+        "overheads": [r[1] for r in answered],
+        "sent": count,
+        "ts_source": ts_source,
+    }
@@ -4,9 +4,12 @@ import time
 from datetime import datetime
 from statistics import mean
 from ping3 import ping
+import argparse
 import os
 import sqlite3
 
+from ping_precise import measure_ping_precise
+
 # ========================
 # CONFIGURATION
 # ========================
@@ -14,6 +17,9 @@ TARGET_HOST = "192.168.1.1"     # IP address or domain to ping (this is my wifi)
 PING_COUNT = 3              # ping times each cycle
 INTERVAL = 10               # time interval between 2 measure time (s)
 CSV_FILE = "data/ping_probe.csv" # output file
+PRECISE_CSV = "data/ping_precise.csv" # extra detail of --precise mode (kernel timestamps)
+BURST_GAP = 1.0             # time between 2 pings inside one cycle in --precise mode (s), e.g. 0.02 for bursts
+TIMEOUT = 2                 # reply timeout (s)
 
 # ========================
 # CYCLIC MEASURE FUNCTION
@@ -39,38 +45,85 @@ def compute_stats(latencies, total_sent):
         avg, jitter = 0, 0
     return avg, jitter, loss
 
-def ensure_csv_header(file):
+def ensure_csv_header(file, header=("timestamp", "host", "latency_ms", "jitter_ms", "loss_percent")):
     if not os.path.exists(file):
+        os.makedirs(os.path.dirname(file) or ".", exist_ok=True)
         with open(file, mode="w", newline="") as f:
             writer = csv.writer(f)
-            writer.writerow(["timestamp", "host", "latency_ms", "jitter_ms", "loss_percent"])
+            writer.writerow(header)
+
+PRECISE_HEADER = ("timestamp", "host", "sent", "received", "latency_ms", "min_ms", "max_ms",
+                  "jitter_ms", "loss_percent", "host_overhead_ms", "ts_source")
 
 # ========================
 # MAIN FUNCTION
 # ========================
-def main():
-    ensure_csv_header(CSV_FILE)
-    print(f"Starting ping probe to {TARGET_HOST}. Data will be saved to {CSV_FILE}")
+def main(args):
+    ensure_csv_header(args.csv)
+    if args.precise:
+        ensure_csv_header(args.precise_csv, PRECISE_HEADER)
+        print(f"Starting precise ping probe to {args.host} (kernel timestamps). Data will be saved to {args.csv} and {args.precise_csv}")
+    else:
+        print(f"Starting ping probe to {args.host}. Data will be saved to {args.csv}")
     while True:
-        latencies = measure_ping(TARGET_HOST, PING_COUNT)
-        avg, jitter, loss = compute_stats(latencies, PING_COUNT)
+        cycle_start = time.monotonic()
+        if args.precise:
+            res = measure_ping_precise(args.host, args.count, gap=args.gap, timeout=args.timeout)
+            latencies = res["latencies"]
+        else:
+            latencies = measure_ping(args.host, args.count)
+        avg, jitter, loss = compute_stats(latencies, args.count)
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-        with open(CSV_FILE, mode="a", newline="") as f:
+        with open(args.csv, mode="a", newline="") as f:
             writer = csv.writer(f)
-            writer.writerow([timestamp, TARGET_HOST,
+            writer.writerow([timestamp, args.host,
                              f"{avg:.2f}" if avg else "NaN",
                              f"{jitter:.2f}" if jitter else "NaN",
                              f"{loss:.2f}"])
-                        
+
         avg_str = f"{avg: .2f}" if avg else "NaN";
         jitter_str = f"{jitter: .2f}" if jitter else "NaN";
         loss_str = f"{loss: .1f}";
 
-        print(f"[{timestamp}] avg = {avg_str}ms | jitter = {jitter_str}ms | loss= {loss_str}%")
-        time.sleep(INTERVAL)
+        if args.precise:
+            # host-side overhead (scheduler + Python) kept out of the RTT and reported on its own
+            overhead = mean(res["overheads"]) if res["overheads"] else None
+            with open(args.precise_csv, mode="a", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow([datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3], args.host,
+                                 res["sent"], len(latencies),
+                                 f"{avg:.3f}" if latencies else "NaN",
+                                 f"{min(latencies):.3f}" if latencies else "NaN",
+                                 f"{max(latencies):.3f}" if latencies else "NaN",
+                                 f"{jitter:.3f}" if latencies else "NaN",
+                                 f"{loss:.2f}",
+                                 f"{overhead:.3f}" if overhead is not None else "NaN",
+                                 res["ts_source"]])
+            overhead_str = f"{overhead: .3f}" if overhead is not None else "NaN"
+            print(f"[{timestamp}] avg = {avg_str}ms | jitter = {jitter_str}ms | loss= {loss_str}% | host overhead = {overhead_str}ms ({res['ts_source']})")
+            # keep the cycle cadence (sub-second intervals allowed)
+            time.sleep(max(0, args.interval - (time.monotonic() - cycle_start)))
+        else:
+            print(f"[{timestamp}] avg = {avg_str}ms | jitter = {jitter_str}ms | loss= {loss_str}%")
+            time.sleep(args.interval)
 
+# -------------------------
+# CLI
+# -------------------------
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Ping probe: ping -> latency/jitter/loss -> csv")
+    parser.add_argument("--host", default=TARGET_HOST, help="IP address or domain to ping")
+    parser.add_argument("--count", "-n", type=int, default=PING_COUNT, help="Pings per cycle")
+    parser.add_argument("--interval", "-t", type=float, default=INTERVAL, help="Interval between cycles (seconds, may be < 1 with --precise)")
+    parser.add_argument("--csv", default=CSV_FILE, help="CSV output filename")
+    parser.add_argument("--precise", action="store_true", help="Raw ICMP with kernel SO_TIMESTAMPING/SO_TIMESTAMPNS timestamps (needs sudo)")
+    parser.add_argument("--gap", "-g", type=float, default=BURST_GAP, help="Gap between pings of one cycle in --precise mode (seconds)")
+    parser.add_argument("--timeout", type=float, default=TIMEOUT, help="Reply timeout in --precise mode (seconds)")
+    parser.add_argument("--precise-csv", default=PRECISE_CSV, help="Detail CSV of --precise mode")
+    args = parser.parse_args()
+    main(args)
 
 # implement with cmd: sudo /home/pi/venv/bin/python ping_probe.py
+# precise mode, bursts of 20 pings 20 ms apart every 0.5 s:
+#   sudo /home/pi/venv/bin/python ping_probe.py --precise --count 20 --gap 0.02 --interval 0.5
@@ -4,6 +4,8 @@ import time
 import csv
 import os
 
+from device_index import DeviceIndex, DeviceAccounting, DEVICES_FILE, DEVICE_CSV, DEVICE_HEADER
+
 # ========================
 # CONFIGURATION
 # ========================
@@ -15,7 +17,9 @@ CSV_FILE = "data/traffic_probe.csv"
 # ========================
 # UTILITY FUNCTIONS
 # ========================
-def analyze_packets(packets):
+def analyze_packets(packets, index=None):
+    # index: optional DeviceIndex -> per-device / per-subnet counters in stats["devices"]
+    accounting = DeviceAccounting(index) if index else None
     stats = {
 #        "total_packets": len(packets),
         "tcp": 0,
@@ -30,37 +34,51 @@ def analyze_packets(packets):
         # This code line to check the integrity of packet like wireshark
         # print(f"{pkt.time}: {pkt.summary()}")
 
-        stats["total_bytes"] += len(pkt)
+        length = len(pkt)
+        stats["total_bytes"] += length
         if pkt.haslayer("TCP"):
-            stats["tcp"] += 1
+            proto = "tcp"
         elif pkt.haslayer("UDP"):
-            stats["udp"] += 1
+            proto = "udp"
         elif pkt.haslayer("ICMP"):
-            stats["icmp"] += 1
+            proto = "icmp"
         else:
-            stats["other"] += 1
+            proto = "other"
+        stats[proto] += 1
+
+        if accounting:
+            ip = pkt["IP"] if pkt.haslayer("IP") else (pkt["IPv6"] if pkt.haslayer("IPv6") else None)
+            eth = pkt["Ether"] if pkt.haslayer("Ether") else None
+            accounting.add(proto, length,
+                           ip.src if ip else None, ip.dst if ip else None,
+                           eth.src if eth else None, eth.dst if eth else None)
 
 # Tổng gói = tổng TCP+UDP+ICMP+Other
     stats["total_packets"] = stats["tcp"] + stats["udp"] + stats["icmp"] + stats["other"]
+    if accounting:
+        stats["devices"] = accounting
     return stats
 
-def ensure_csv_header(file):
+def ensure_csv_header(file, header=("timestamp", "total_packets", "tcp", "udp", "icmp", "other", "total_bytes")):
     if not os.path.exists(file):
         os.makedirs(os.path.dirname(file), exist_ok=True)
         with open(file, mode="w", newline="") as f:
             writer = csv.writer(f)
-            writer.writerow(["timestamp", "total_packets", "tcp", "udp", "icmp", "other", "total_bytes"])
+            writer.writerow(header)
 
 # ========================
 # MAIN FUNCTION
 # ========================
 def main():
     ensure_csv_header(CSV_FILE)
+    index = DeviceIndex.from_file(DEVICES_FILE)
+    if index:
+        ensure_csv_header(DEVICE_CSV, DEVICE_HEADER)
     print(f"Starting Scapy capture on interface '{IFACE}'. Data will be saved to {CSV_FILE}")
     while True:
         print(f"Capturing {CAPTURE_TIME}s of traffic on {IFACE}...")
         packets = sniff(iface=IFACE, timeout=CAPTURE_TIME)
-        stats = analyze_packets(packets)
+        stats = analyze_packets(packets, index)
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
         with open(CSV_FILE, mode="a", newline="") as f:
@@ -75,6 +93,9 @@ def main():
                 stats["total_bytes"]
             ])
 
+        if index:
+            with open(DEVICE_CSV, mode="a", newline="") as f:
+                csv.writer(f).writerows(stats["devices"].rows(timestamp, "scapy"))
 
         print(f"[{timestamp}] total={stats['total_packets']} | tcp={stats['tcp']} | udp={stats['udp']} | icmp={stats['icmp']} | bytes={stats['total_bytes']}")
         time.sleep(INTERVAL)
@@ -8,6 +8,8 @@ import shutil
 from datetime import datetime
 import argparse
 
+from device_index import DeviceIndex, DeviceAccounting, DEVICES_FILE, DEVICE_CSV, DEVICE_HEADER
+
 # -------------------------
 # CONFIG
 # -------------------------
@@ -38,7 +40,17 @@ def tshark_pcap_to_json(pcap_path):
     data = proc.stdout.decode('utf-8', errors='replace')    # utf-8 (JSON standard data) to string
     return json.loads(data) # return JSON to Python object to analyze
 
-def analyze_packets_from_json(json_packets):
+def _layer_field(layers, layer, key):
+    # tshark json values are strings, sometimes lists of strings
+    v = layers.get(layer, {})
+    v = v.get(key) if isinstance(v, dict) else None
+    if isinstance(v, list):
+        v = v[0] if v else None
+    return v
+
+def analyze_packets_from_json(json_packets, index=None):
+    # index: optional DeviceIndex -> per-device / per-subnet counters in result["devices"]
+    accounting = DeviceAccounting(index) if index else None
     total = 0
     tcp = udp = icmp = other = 0
     total_bytes = 0
@@ -68,14 +80,26 @@ def analyze_packets_from_json(json_packets):
 
         if "tcp" in keys:
             tcp += 1
+            proto = "tcp"
         elif "udp" in keys:
             udp += 1
+            proto = "udp"
         elif "icmp" in keys or "icmpv6" in keys:
             icmp += 1
+            proto = "icmp"
         else:
             other += 1
+            proto = "other"
+
+        if accounting:
+            ip_layer, prefix = ("ip", "ip") if "ip" in keys else ("ipv6", "ipv6")
+            accounting.add(proto, fl,
+                           _layer_field(layers, ip_layer, f"{prefix}.src"),
+                           _layer_field(layers, ip_layer, f"{prefix}.dst"),
+                           _layer_field(layers, "eth", "eth.src"),
+                           _layer_field(layers, "eth", "eth.dst"))
 
-    return {
+    result = {
         "total": total,
         "tcp": tcp,
         "udp": udp,
@@ -83,13 +107,16 @@ def analyze_packets_from_json(json_packets):
         "other": other,
         "bytes": total_bytes
     }
+    if accounting:
+        result["devices"] = accounting
+    return result
 
-def ensure_csv_header(file):
+def ensure_csv_header(file, header=("timestamp", "iface", "capture_time_s", "total_pkts", "tcp", "udp", "icmp", "other", "total_bytes")):
     if not os.path.exists(file):
         os.makedirs(os.path.dirname(file), exist_ok=True)
         with open(file, mode="w", newline="") as f:
             writer = csv.writer(f)
-            writer.writerow(["timestamp", "iface", "capture_time_s", "total_pkts", "tcp", "udp", "icmp", "other", "total_bytes"])
+            writer.writerow(header)
 
 
 # -------------------------
@@ -103,6 +130,10 @@ def main(args):
     csv_file = args.csv
 
     ensure_csv_header(csv_file)
+    index = DeviceIndex.from_file(args.devices)
+    if index:
+        ensure_csv_header(args.device_csv, DEVICE_HEADER)
+        print(f"Per-device accounting from {args.devices} → CSV: {args.device_csv}")
     print("tshark path:", tshark_path)
     print(f"Start TShark probe — iface={iface} capture_time={capture_time}s interval={interval}s → CSV: {csv_file}")
     print("Note: you may need to run this script with Administrator / sudo to capture on an interface.\n")
@@ -119,13 +150,16 @@ def main(args):
                 # convert to JSON
                 json_packets = tshark_pcap_to_json(tmp_path)
                 # analyze
-                stats = analyze_packets_from_json(json_packets)
+                stats = analyze_packets_from_json(json_packets, index)
                 timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                 # append to CSV
                 with open(csv_file, mode="a", newline="") as f:
                     writer = csv.writer(f)
                     writer.writerow([timestamp, iface or "default", capture_time,
                                      stats["total"], stats["tcp"], stats["udp"], stats["icmp"], stats["other"], stats["bytes"]])
+                if index:
+                    with open(args.device_csv, mode="a", newline="") as f:
+                        csv.writer(f).writerows(stats["devices"].rows(timestamp, "tshark"))
                 print(f"[{timestamp}] total={stats['total']} | tcp={stats['tcp']} | udp={stats['udp']} | icmp={stats['icmp']} | other={stats['other']} | bytes={stats['bytes']}")
             finally:
                 # delete temporary pcap
@@ -148,6 +182,8 @@ if __name__ == "__main__":
     parser.add_argument("--capture-time", "-c", type=int, default=CAPTURE_TIME, help="Capture duration in seconds")
     parser.add_argument("--interval", "-t", type=int, default=INTERVAL, help="Interval between captures (seconds)")
     parser.add_argument("--csv", default=CSV_FILE, help="CSV output filename")
+    parser.add_argument("--devices", default=DEVICES_FILE, help="Subnet/device map JSON for per-device accounting (skipped if missing)")
+    parser.add_argument("--device-csv", default=DEVICE_CSV, help="Per-device CSV output filename")
     args = parser.parse_args()
     main(args)
 